@@ -15,6 +15,7 @@ import functools
 import logging
 import mimetypes
 import os
+import secrets
 import time
 from dataclasses import dataclass
 from datetime import date, timedelta
@@ -26,8 +27,7 @@ from urllib.parse import urlsplit, parse_qs
 
 import pyotp
 import requests
-from bs4 import BeautifulSoup
-from rich.progress import Progress, TimeElapsedColumn
+from urllib3.fields import RequestField
 
 
 class FileNotFoundException(Exception):
@@ -61,6 +61,54 @@ class SecureString(str):
         return "***"
 
 
+class MultipartFileStream:
+    """Streaming multipart/form-data request body for a single file.
+
+    `requests` builds multipart bodies passed with `files=` entirely in
+    memory. Passing an instance of this class as `data=` instead streams
+    the file from disk in chunks, while still sending a Content-Length
+    header.
+
+    Args:
+        field_name: Name of the form field for the file
+        path: Path to the file to upload
+        content_type: Content type of the file, if known
+        chunk_size: Number of bytes to read from the file at a time
+    """
+
+    def __init__(
+        self,
+        field_name: str,
+        path: Path,
+        content_type: str | None = None,
+        chunk_size: int = 65536,
+    ):
+        boundary = secrets.token_hex(16)
+        field = RequestField(name=field_name, data=b"", filename=path.name)
+        field.make_multipart(content_type=content_type)
+
+        self.path = path
+        # stat the file once, so the Content-Length requests sends always
+        # matches the number of bytes streamed.
+        self.size = path.stat().st_size
+        self.chunk_size = chunk_size
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._head = f"--{boundary}\r\n{field.render_headers()}".encode()
+        self._tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def __len__(self) -> int:
+        return len(self._head) + self.size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        with open(self.path, "rb") as file:
+            remaining = self.size
+            while remaining and (chunk := file.read(min(self.chunk_size, remaining))):
+                remaining -= len(chunk)
+                yield chunk
+        yield self._tail
+
+
 @dataclass
 class PMHCSpecificationRepresentation:
     """Dataclass which provides structure for PMHCSpecification Enum."""
@@ -146,6 +194,10 @@ class PMHC:
         will be automatically combined with the current time to derive the
         correct 6 digit code.
 
+        If this session has already logged in successfully, the session
+        is still valid, and no credentials are passed as arguments, the
+        login process is skipped.
+
         Args:
             username: PMHC username
             password: PMHC password
@@ -156,6 +208,24 @@ class PMHC:
         pmhc_auth_url = "https://pmhc-mds.net/api/auth/login"
         pmhc_login_url = "https://pmhc-mds.net/api/current-user"
 
+        # Skip the full login flow if this session is already logged in.
+        # There is no point probing a fresh session, as it will not have
+        # any session cookies yet. If credentials are passed explicitly,
+        # always log in with them, as they may be for a different user.
+        # An expired session may return a non-JSON error page, so fall
+        # back to a full login on any unsuccessful or non-JSON response.
+        if self.user_info is not None and not (username or password or totp_secret):
+            probe = self.s.get(pmhc_login_url)
+            try:
+                user_info = probe.json() if probe.ok else None
+            except requests.JSONDecodeError:
+                user_info = None
+            if user_info and "error" not in user_info:
+                logging.info("Already logged in to PMHC. Skipping login.")
+                self.user_info = user_info
+                return
+            logging.info("PMHC session is no longer valid. Logging in again.")
+
         # Prompt user for credentials if not set in env.
         username = username or os.getenv("PMHC_USERNAME")
         password = SecureString(password or os.getenv("PMHC_PASSWORD") or "")
@@ -218,6 +288,10 @@ class PMHC:
         if mfa_url.startswith("https://login.logicly.com.au/u/login/password"):
             logging.debug("Got password URL instead of expected MFA URL:")
             logging.debug(f"{mfa_url}")
+            # Imported here, as this is the only use of bs4, and it is
+            # only needed when login fails.
+            from bs4 import BeautifulSoup
+
             error_soup = BeautifulSoup(password_request.text, "html.parser")
             error_message = error_soup.select_one(
                 'span[id="error-element-password"]'
@@ -251,7 +325,7 @@ class PMHC:
         )
 
         # confirm login was successful
-        user_query = self.s.get("https://pmhc-mds.net/api/current-user")
+        user_query = self.s.get(pmhc_login_url)
         self.user_info = user_query.json()
 
         # error key will be present if login was unsuccessful
@@ -309,17 +383,16 @@ class PMHC:
         )
 
         # First PUT the file and receive a uuid
-        with open(input_file, "rb") as file:
-            upload_response = self.s.put(
-                "https://uploader.strategicdata.com.au/upload",
-                files={
-                    "file": (
-                        input_file.name,  # file name
-                        file,  # file object
-                        mimetypes.guess_type(input_file)[0],  # content type
-                    )
-                },
-            )
+        # Stream the file from disk, rather than building the whole
+        # multipart body in memory, as PMHC input files can be large.
+        body = MultipartFileStream(
+            "file", input_file, mimetypes.guess_type(input_file)[0]
+        )
+        upload_response = self.s.put(
+            "https://uploader.strategicdata.com.au/upload",
+            data=body,
+            headers={"Content-Type": body.content_type},
+        )
 
         upload_status = upload_response.json()
         logging.debug("Upload status:")
@@ -348,16 +421,27 @@ class PMHC:
         """Waits for a PMHC upload to complete processing in 'test' mode"""
 
         # check to see if the PMHC upload queue is free
-        delay = 10
+        # In the common case nothing is processing, so return straight
+        # away without starting a progress bar.
+        if not self.is_upload_processing():
+            return
+
+        # Imported here to avoid the cost of importing rich for scripts
+        # which never need to wait for an upload.
+        from rich.progress import Progress, TimeElapsedColumn
+
+        # Poll frequently at first, so that short uploads are detected
+        # promptly, then back off exponentially up to max_delay to
+        # avoid hammering the PMHC API while long uploads process.
+        delay = 5
+        max_delay = 60
         with Progress(*Progress.get_default_columns(), TimeElapsedColumn()) as progress:
-            processing_task = progress.add_task(
-                "Checking PMHC upload queue...", total=None
-            )
-            while self.is_upload_processing():
-                progress.update(
-                    processing_task, description="Waiting for PMHC processing..."
-                )
+            progress.add_task("Waiting for PMHC processing...", total=None)
+            while True:
                 time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+                if not self.is_upload_processing():
+                    break
 
     def download_error_json(self, uuid: str, download_folder: Path = Path(".")) -> Path:
         """Downloads a JSON error file from PMHC
@@ -375,17 +459,51 @@ class PMHC:
         """
 
         url = f"https://pmhc-mds.net/api/organisations/{self.organisation_path}/uploads/{uuid}"
-        upload_errors_json = self.s.get(url)
+        # Stream to disk, as error files for large uploads can be big.
+        upload_errors_json = self.s.get(url, stream=True)
 
         download_folder.mkdir(parents=True, exist_ok=True)
         filename = download_folder / f"{uuid}.json"
         with open(filename, "wb") as file:
-            file.write(upload_errors_json.content)
+            for content in upload_errors_json.iter_content(chunk_size=65536):
+                file.write(content)
 
         logging.info(f"Saved JSON file to disk: '{filename}'")
 
         return filename
 
+    def upload_and_download_error_json(
+        self,
+        input_file: Path,
+        test: bool = True,
+        download_folder: Path = Path("."),
+    ) -> Path:
+        """Uploads a file to PMHC, waits for PMHC to finish processing
+        it, then downloads the JSON error file for the upload.
+
+        This chains upload_file(), wait_for_upload_status() and
+        download_error_json(), using the uuid returned by the upload
+        directly, so there is no need to look the upload up again.
+
+        Args:
+            input_file: Path to the file e.g.
+                `'PMHC_MDS_20230101_20230131.xlsx'`
+            test: Upload in 'test' or 'live' mode? Defaults to `True`
+                ('test'). Use `False` ('live') with care!
+            download_folder: Location to save the downloaded error
+                JSON.
+
+        Raises:
+            CouldNotFindPmhcUpload: If the upload does not appear in
+                your recent PMHC uploads
+
+        Returns:
+            Path to JSON file saved to local disk
+        """
+        uuid = self.upload_file(input_file, test=test)
+        self.wait_for_upload_status(uuid)
+        return self.download_error_json(uuid, download_folder)
+
     def is_upload_processing(self) -> bool:
         """Checks if the user has an upload currently processing in either live or
         test mode. Useful for checking before we do certain actions e.g. try upload
@@ -407,12 +525,76 @@ class PMHC:
             headers={"Range": "0-19"},
         ).json()
         # see if any are in a 'processing' state
-        for json in json_list:
-            if "status" in json and json["status"] == "processing":
-                return True
+        # If none are processing, we are free to now upload a new file
+        return any(upload.get("status") == "processing" for upload in json_list)
+
+    def get_upload_status(self, uuid: str) -> str | None:
+        """Gets the status of the upload with the given uuid.
+
+        Args:
+            uuid: PMHC upload uuid, as returned by upload_file()
+
+        Returns:
+            The upload status, for example `'processing'`, `'complete'`
+            or `'error'`. `None` if the upload is not in your recent
+            uploads, for example if PMHC has not listed it yet.
+        """
+        # Uploads can only be filtered by 'name', not 'username' (see
+        # is_upload_processing()), so match on uuid to ignore uploads by
+        # any other users with the same name.
+        pmhc_name = self.user_info["name"]
+        json_list = self.s.get(
+            f"https://pmhc-mds.net/api/uploads?name={pmhc_name}&sort=-date",
+            headers={"Range": "0-19"},
+        ).json()
+        upload = next((item for item in json_list if item.get("uuid") == uuid), None)
+        return None if upload is None else upload.get("status")
+
+    def wait_for_upload_status(self, uuid: str, max_retries: int = 20) -> str:
+        """Waits for the upload with the given uuid to finish processing.
+
+        Unlike wait_for_upload(), which waits for the upload queue to be
+        free, this follows a single upload. It keeps waiting while the
+        upload is processing, or has not been listed by PMHC yet.
+
+        Args:
+            uuid: PMHC upload uuid, as returned by upload_file()
+            max_retries: Number of consecutive checks the upload may be
+                missing from your recent uploads before giving up.
+
+        Raises:
+            CouldNotFindPmhcUpload: If the upload is still missing after
+                `max_retries` checks
+
+        Returns:
+            The final upload status, for example `'complete'` or
+            `'error'`.
+        """
+        # Imported here to avoid the cost of importing rich for scripts
+        # which never need to wait for an upload.
+        from rich.progress import Progress, TimeElapsedColumn
 
-        # all ok, none are processing, we are free to now upload a new file
-        return False
+        # Poll frequently at first, then back off, as in wait_for_upload().
+        delay = 5
+        max_delay = 60
+        retries = 0
+        with Progress(*Progress.get_default_columns(), TimeElapsedColumn()) as progress:
+            progress.add_task("Waiting for PMHC processing...", total=None)
+            while True:
+                status = self.get_upload_status(uuid)
+                if status is None:
+                    retries += 1
+                    if retries >= max_retries:
+                        raise CouldNotFindPmhcUpload(
+                            f"Upload {uuid} not found in recent PMHC uploads "
+                            f"after {retries} checks"
+                        )
+                elif status != "processing":
+                    return status
+                else:
+                    retries = 0
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
 
     def wait_for_extract(self, uuid: str, max_retries: int = 20) -> bool:
         """Wait for an extract with given uuid to have status
@@ -453,9 +635,15 @@ class PMHC:
         If Error, the extract has failed. Exit.
         """
         retries = 0
+        # Small extracts are often ready within a few seconds, so don't
+        # wait a full 30 seconds before the first check. Back off up to
+        # max_delay for extracts which take longer.
+        delay = 5
+        max_delay = 30
         while retries < max_retries:
             logging.info(f"wait_for_extract: attempt: {retries}")
-            time.sleep(30)
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
             try:
                 extracts_request = self.s.get(
                     "https://pmhc-mds.net/api/extract?sort=-date"
@@ -568,7 +756,6 @@ class PMHC:
         try:
             download_uuid = download_response["uuid"]
         except KeyError as err:
-            progress.stop()
             logging.error("Could not find uuid in the following JSON:")
             logging.error(download_response)
             logging.error(